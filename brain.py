@@ -1,11 +1,14 @@
 import sqlite3
 import random
+import math
+import itertools
 import time
 import sys
+from db import get_db_connection, close_db_connection, require_tables
 
 # --- Configuration ---
-DB_NAME = 'master_db.sqlite'
-EXPLOIT_THRESHOLD = 0.8  # 80% chance to exploit, 20% to explore
+REQUIRED_TABLES = ('videos', 'fame_velocity')
+BOOTSTRAP_ROUNDS = 10  # Pure random exploration until this many videos have been analyzed
 
 # Define the parameter space for exploration
 EXPLORE_GENRES = ['creepy pasta', 'weird history fact', 'shocking science fact', 'uplifting personal story', 'mind-bending puzzle']
@@ -14,81 +17,69 @@ EXPLORE_VOICES = ['en_US-kss-low', 'en_US-ljspeech-medium', 'en_US-vctk-low'] #
 
 # --- Database Functions ---
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
-        print(f"Error connecting to database: {e}", file=sys.stderr)
-        return None
-
-def find_best_parameters(conn):
+def load_arm_stats(conn):
     """
-    Finds the best-performing parameters (genre, image_style, voice)
-    based on 'Fame Velocity'.
+    Loads the 'Fame Velocity' totals for every (genre, image_style, voice)
+    combination ("arm") that has been measured.
     
     Fame Velocity = Avg. view gain between 2 and 10 hours post-upload.
-    This query is the core of the 'exploit' logic.
+    The per-combination totals are maintained by feedback.py in the
+    'fame_velocity' table, so this is a lookup rather than a log scan.
+    Returns a dict of (genre, image_style, voice) -> (total_gain, n).
     """
     query = """
-    WITH VideoGains AS (
-        -- 1. Calculate the view gain for each video in the 2-10 hour window
-        SELECT
-            v.video_key,
-            v.genre,
-            v.image_style,
-            v.voice,
-            -- Find the difference between the max and min views in the window
-            MAX(p.views) - MIN(p.views) AS view_gain
-        FROM
-            videos v
-        JOIN
-            performance_log p ON v.video_key = p.video_key
-        WHERE
-            -- Only look at videos that have been uploaded and analyzed
-            v.status = 'ANALYZED' AND
-            -- Define the 2-10 hour window (7200 to 36000 seconds)
-            p.timestamp BETWEEN (v.upload_time + 7200) AND (v.upload_time + 36000)
-        GROUP BY
-            v.video_key, v.genre, v.image_style, v.voice
-        HAVING
-            -- Ensure we have at least two data points to measure a gain
-            COUNT(p.log_id) > 1
-    )
-    -- 2. Average the view_gain for each unique combination of parameters
     SELECT
         genre,
         image_style,
         voice,
-        AVG(view_gain) AS fame_velocity
+        total_gain,
+        n
     FROM
-        VideoGains
-    GROUP BY
-        genre,
-        image_style,
-        voice
-    ORDER BY
-        fame_velocity DESC
-    LIMIT 1;
+        fame_velocity
+    WHERE
+        n > 0;
     """
     try:
         cursor = conn.cursor()
         cursor.execute(query)
-        result = cursor.fetchone()
-        if result:
-            print(f"[Brain] Exploit: Found best parameters with {result['fame_velocity']:.0f} avg velocity.")
-            return (result['genre'], result['image_style'], result['voice'])
+        return {
+            (row['genre'], row['image_style'], row['voice']): (row['total_gain'], row['n'])
+            for row in cursor.fetchall()
+        }
     except sqlite3.Error as e:
         print(f"Error in 'exploit' query: {e}", file=sys.stderr)
-        
-    return None
+        return {}
+
+def choose_ucb1_parameters(arm_stats):
+    """
+    Picks the arm with the highest UCB1 score:
+        mean_a / max_mean + sqrt(2 * ln(N) / n_a)
+    Means are scaled to [0, 1] so view counts don't drown out the
+    exploration bonus. Arms that were never measured score infinity,
+    so they are tried (in random order) before any arm is repeated.
+    """
+    arms = set(itertools.product(EXPLORE_GENRES, EXPLORE_STYLES, EXPLORE_VOICES)) | set(arm_stats)
+    unseen = sorted(arm for arm in arms if arm not in arm_stats)
+    if unseen:
+        print(f"[Brain] Explore: Trying one of {len(unseen)} unmeasured combinations.")
+        return random.choice(unseen)
+
+    total_n = sum(n for _, n in arm_stats.values())
+    means = {arm: total_gain / n for arm, (total_gain, n) in arm_stats.items()}
+    scale = max(means.values()) or 1
+
+    def ucb1(arm):
+        return means[arm] / scale + math.sqrt(2 * math.log(total_n) / arm_stats[arm][1])
+
+    best = max(arm_stats, key=ucb1)
+    print(f"[Brain] UCB1: Chose parameters with {means[best]:.0f} avg velocity "
+          f"over {arm_stats[best][1]} videos (score {ucb1(best):.2f}).")
+    return best
 
 def explore_parameters():
     """
-S    elects a random set of parameters.
-    This is the 'explore' logic.
+    Selects a random set of parameters.
+    This is the bootstrap 'explore' logic.
     """
     print("[Brain] Explore: Trying a new combination.")
     genre = random.choice(EXPLORE_GENRES)
@@ -119,29 +110,31 @@ def insert_new_job(conn, genre, style, voice):
 def main():
     """
     Main function for the 'Brain'.
-    Implements the 80/20 Multi-Armed Bandit logic.
+    Implements the Multi-Armed Bandit logic (UCB1 over parameter combinations).
+    Returns the process exit status (0 on success).
     """
     conn = get_db_connection()
     if not conn:
-        return
+        return 1
 
     try:
-        # Check if we have enough data to exploit
-        best_params = find_best_parameters(conn)
+        if not require_tables(conn, REQUIRED_TABLES):
+            return 1
+
+        arm_stats = load_arm_stats(conn)
         
-        # Multi-Armed Bandit: 80% Exploit, 20% Explore
-        if best_params and random.random() < EXPLOIT_THRESHOLD:
-            # Exploit
-            genre, style, voice = best_params
-        else:
-            # Explore (or exploit failed)
+        # Bootstrap with random picks, then let UCB1 balance exploit vs. explore
+        if sum(n for _, n in arm_stats.values()) < BOOTSTRAP_ROUNDS:
             genre, style, voice = explore_parameters()
+        else:
+            genre, style, voice = choose_ucb1_parameters(arm_stats)
             
         # Create the new job
         insert_new_job(conn, genre, style, voice)
+        return 0
         
     finally:
-        conn.close()
+        close_db_connection(conn)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,35 +1,101 @@
-import sqlite3
 import torch
-from transformers import pipeline, SpeechT5Processor, SpeechT5ForTextToSpeech, SpeechT5HifiGan
-from diffusers import StableDiffusionXLPipeline, AutoencoderKL
-from moviepy.editor import *
+import soundfile as sf
+from transformers import AutoModelForCausalLM, AutoTokenizer, SpeechT5Processor, SpeechT5ForTextToSpeech, SpeechT5HifiGan
+from diffusers import StableDiffusionXLPipeline, AutoencoderKL, LCMScheduler
+from diffusers.models.attention_processor import AttnProcessor2_0
 import os
 import sys
+import time
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 from datasets import load_dataset
+from huggingface_hub import snapshot_download
 import re
+import subprocess
+import functools
+from collections import OrderedDict
+from db import get_db_connection, close_db_connection
+
+try:
+    from optimum.quanto import quantize, freeze, qint8
+except ImportError:
+    quantize = None
 
 # --- Configuration ---
-DB_NAME = 'master_db.sqlite'
 VIDEO_OUTPUT_DIR = 'created_videos'
+WORKER_POLL_INTERVAL = 5 # seconds between idle database checks
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 print(f"[Creator] Using device: {DEVICE}")
+if DEVICE == "cuda":
+    # Allow TF32 tensor cores for any fp32 matmuls left in the pipelines
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.set_float32_matmul_precision('high')
+
+# Text generation: up to STORY_BATCH_SIZE pending jobs get their stories from one generate() call.
+# Only a lone worker batches; per-GPU workers claim one job at a time so the queue spreads across GPUs.
+STORY_BATCH_SIZE = 4
+STORY_MAX_NEW_TOKENS = 150
+_SENT_RE = re.compile(r'(?<=[.!?])\s+') # sentence boundary: whitespace after . ! or ?
+
+# Image generation: all prompts of a job go through SDXL in one batch,
+# split into pairs on GPUs with less than 12 GB of VRAM.
+# SDXL base runs with the LCM-LoRA, which needs only a few steps and no CFG.
+IMAGE_LCM_LORA = "latent-consistency/lcm-lora-sdxl"
+IMAGE_INFERENCE_STEPS = 4
+IMAGE_GUIDANCE_SCALE = 0.0
+# Fixed portrait SDXL bucket (close to 9:16); 1080x1920 itself isn't divisible by the UNet's downsampling
+IMAGE_WIDTH = 768
+IMAGE_HEIGHT = 1344
+MAX_IMAGE_BATCH_SIZE = 5
+LOW_VRAM_IMAGE_BATCH_SIZE = 2
+LOW_VRAM_BYTES = 12 * 1024**3
+PROMPT_EMBED_CACHE_SIZE = 64 # text-encoder outputs kept per worker
+_prompt_embed_cache = OrderedDict()
+
+# bf16 on GPUs whose tensor cores support it (Ampere and newer), fp16 otherwise.
+# When optimum-quanto is installed, SDXL UNet and SpeechT5 weights are stored as int8.
+MODEL_DTYPE = torch.bfloat16 if DEVICE == "cuda" and torch.cuda.is_bf16_supported() else torch.float16
+QUANTIZE_INT8 = DEVICE == "cuda" and quantize is not None
+
+# Compile the hot GPU modules (SDXL UNet, HiFi-GAN vocoder) with torch.compile.
+COMPILE_MODELS = DEVICE == "cuda"
+
+# Video assembly (ffmpeg)
+VIDEO_SIZE = (1080, 1920)
+VIDEO_FPS = 24
+CAPTION_FONT = 'Inter' # Assumes 'Inter' (Bold) is installed for fontconfig
+
+# Hugging Face repos used by initialize_models, for `python creator.py --download`:
+# repo_id -> (repo_type, allow_patterns); patterns skip the unused fp32/TF/Flax weights.
+MODEL_REPOS = {
+    'gpt2': ('model', ["*.json", "*.txt", "*.safetensors"]),
+    'microsoft/speecht5_tts': ('model', ["*.json", "*.model", "*.bin", "*.safetensors"]),
+    'microsoft/speecht5_hifigan': ('model', ["*.json", "*.bin", "*.safetensors"]),
+    'Matthijs/cmu-arctic-xvectors': ('dataset', None),
+    'madebyollin/sdxl-vae-fp16-fix': ('model', ["*.json", "diffusion_pytorch_model.safetensors"]),
+    'stabilityai/stable-diffusion-xl-base-1.0': ('model', ["*.json", "*.txt", "*.fp16.safetensors"]),
+    'latent-consistency/lcm-lora-sdxl': ('model', ["*.safetensors"]),
+}
 
 # Ensure output directory exists
 os.makedirs(VIDEO_OUTPUT_DIR, exist_ok=True)
 
 # --- Database Functions ---
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def get_pending_job(conn):
-    """Fetches the oldest PENDING job."""
+def get_pending_jobs(conn, limit):
+    """Fetches up to `limit` of the oldest PENDING jobs."""
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM videos WHERE status = 'PENDING' ORDER BY video_key LIMIT 1")
-    return cursor.fetchone()
+    cursor.execute("SELECT * FROM videos WHERE status = 'PENDING' ORDER BY video_key LIMIT ?", (limit,))
+    return cursor.fetchall()
+
+def claim_job(conn, video_key):
+    """Atomically moves a PENDING job to CREATING. Returns False if another worker got it first."""
+    cursor = conn.execute(
+        "UPDATE videos SET status = 'CREATING' WHERE video_key = ? AND status = 'PENDING'",
+        (video_key,)
+    )
+    conn.commit()
+    return cursor.rowcount == 1
 
 def update_job_status(conn, video_key, status, script=None, hook=None):
     """Updates the status and (optionally) the generated script/hook of a job."""
@@ -51,17 +117,40 @@ def update_job_status(conn, video_key, status, script=None, hook=None):
 
 # --- AI Model Functions ---
 
-def initialize_models():
-    """Loads all necessary AI models into memory."""
+def download_models():
+    """
+    Pre-fetches every model repo into the local Hugging Face cache (deploy time),
+    so later runs with HF_HUB_OFFLINE=1 load them with no network lookups.
+    """
+    for repo_id, (repo_type, allow_patterns) in MODEL_REPOS.items():
+        print(f"[Creator] Downloading {repo_id}...")
+        snapshot_download(repo_id, repo_type=repo_type, allow_patterns=allow_patterns)
+    print("[Creator] All models downloaded.")
+
+def initialize_models(shard=False):
+    """
+    Loads all necessary AI models into memory. With shard=True the SDXL
+    components are spread over all visible GPUs (device_map="balanced")
+    instead of all being placed on DEVICE.
+    """
     print("[Creator] Loading all AI models...")
     try:
         # Text Generation (e.g., GPT-2)
-        text_generator = pipeline('text-generation', model='gpt2', device=DEVICE)
+        # Direct model + tokenizer (no pipeline) so several stories can share one batched generate()
+        text_tokenizer = AutoTokenizer.from_pretrained('gpt2', padding_side='left')
+        text_tokenizer.pad_token = text_tokenizer.eos_token
+        text_model = AutoModelForCausalLM.from_pretrained(
+            'gpt2', torch_dtype=MODEL_DTYPE if DEVICE == "cuda" else torch.float32
+        ).to(DEVICE).eval()
         
         # Speech Generation (e.g., SpeechT5)
         speech_processor = SpeechT5Processor.from_pretrained("microsoft/speecht5_tts")
         speech_model = SpeechT5ForTextToSpeech.from_pretrained("microsoft/speecht5_tts").to(DEVICE)
         vocoder = SpeechT5HifiGan.from_pretrained("microsoft/speecht5_hifigan").to(DEVICE)
+        if QUANTIZE_INT8:
+            # Weight-only int8; activations stay fp32 so speaker embeddings need no cast
+            quantize(speech_model, weights=qint8)
+            freeze(speech_model)
         
         # Load speaker embeddings (using a standard dataset)
         speaker_embeddings = load_dataset("Matthijs/cmu-arctic-xvectors", split="validation")
@@ -74,148 +163,320 @@ def initialize_models():
 
         # Image Generation (e.g., Stable Diffusion XL)
         # Load VAE for better performance/memory
-        vae = AutoencoderKL.from_pretrained("madebyollin/sdxl-vae-fp16-fix", torch_dtype=torch.float16)
+        # (the latents are decoded in the pipeline dtype, so the VAE has to match it)
+        vae = AutoencoderKL.from_pretrained("madebyollin/sdxl-vae-fp16-fix", torch_dtype=MODEL_DTYPE, low_cpu_mem_usage=True)
         image_generator = StableDiffusionXLPipeline.from_pretrained(
             "stabilityai/stable-diffusion-xl-base-1.0",
             vae=vae,
-            torch_dtype=torch.float16,
+            torch_dtype=MODEL_DTYPE,
             variant="fp16",
-            use_safetensors=True
-        ).to(DEVICE)
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+            device_map="balanced" if shard else None
+        )
+        if not shard:
+            image_generator = image_generator.to(DEVICE)
+
+        # Few-step LCM sampling, LoRA fused into the UNet weights; unloading then strips the
+        # PEFT wrappers and A/B matrices so quanto and torch.compile only see plain Linears
+        image_generator.load_lora_weights(IMAGE_LCM_LORA)
+        image_generator.fuse_lora()
+        image_generator.unload_lora_weights()
+        image_generator.scheduler = LCMScheduler.from_config(image_generator.scheduler.config)
+        if QUANTIZE_INT8:
+            quantize(image_generator.unet, weights=qint8)
+            freeze(image_generator.unet)
+
+        # Fused SDPA attention kernels + compiled UNet/vocoder
+        image_generator.unet.set_attn_processor(AttnProcessor2_0())
+        if COMPILE_MODELS:
+            # quanto's int8 weight tensors introduce graph breaks, so only demand a full graph without them
+            image_generator.unet = torch.compile(image_generator.unet, mode="reduce-overhead", fullgraph=not QUANTIZE_INT8)
+            # Spectrogram length varies with the script, so let the vocoder trace dynamic shapes
+            vocoder = torch.compile(vocoder, dynamic=True)
         
         print("[Creator] All models loaded successfully.")
-        return text_generator, speech_processor, speech_model, vocoder, speaker_embedding_map, image_generator
+        return text_model, text_tokenizer, speech_processor, speech_model, vocoder, speaker_embedding_map, image_generator
     
     except Exception as e:
         print(f"Error loading models: {e}. Check VRAM and dependencies.", file=sys.stderr)
-        return (None,) * 6
+        return (None,) * 7
 
-def generate_text_and_sentences(generator, genre):
-    """Generates a short story and splits it into sentences."""
-    prompt = f"Write a 150-word {genre} story that is shocking, viral, and has a twist ending. The story must be captivating for a short video. Story:"
+def warmup_models(models):
+    """Runs a dummy prompt through the compiled models so the first real job doesn't pay compile cost."""
+    if not COMPILE_MODELS:
+        return
+    print("[Creator] Warming up compiled models...")
+    text_model, text_tokenizer, speech_proc, speech_model, vocoder, speaker_map, img_gen = models
+    with torch.no_grad():
+        inputs = speech_proc(text="Warming up.", return_tensors="pt").to(DEVICE)
+        speech_model.generate_speech(inputs["input_ids"], speaker_map['en_US-ljspeech-medium'], vocoder=vocoder)
+    # Same padded batch size and resolution as real jobs, so the captured CUDA graph is reused
+    run_image_batch(img_gen, [""])
+
+def generate_text_and_sentences(model, tokenizer, genres):
+    """
+    Generates one short story per genre in a single batched generate() call
+    and splits each into sentences. Returns a list of (story_text, sentences).
+    """
+    prompts = [f"Write a 150-word {genre} story that is shocking, viral, and has a twist ending. The story must be captivating for a short video. Story:"
+               for genre in genres]
     
-    # max_length should be prompt_length + new_tokens
-    response = generator(prompt, max_length=200, num_return_sequences=1, truncation=True)
-    story_text = response[0]['generated_text'].replace(prompt, "").strip()
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(DEVICE)
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=STORY_MAX_NEW_TOKENS,
+            do_sample=True,
+            temperature=0.9,
+            use_cache=True,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    # Prompts are left-padded, so every continuation starts at the same offset
+    continuations = tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
     
-    # Clean up and split into sentences
-    story_text = story_text.replace("\n", " ").replace("..", ".").strip()
-    sentences = re.split(r'(?<=[.!?])\s+', story_text)
-    sentences = [s.strip() for s in sentences if s.strip()]
+    results = []
+    for story_text in continuations:
+        # Clean up and split into sentences
+        story_text = story_text.replace("\n", " ").replace("..", ".").strip()
+        sentences = [s.strip() for s in _SENT_RE.split(story_text) if s.strip()]
+        results.append((story_text, sentences))
     
-    return story_text, sentences
+    return results
 
 def generate_speech(processor, model, vocoder, speaker_embedding, text, output_path):
-    """Converts text to an MP3 file."""
+    """
+    Converts text to a 16 kHz WAV file. The WAV is muxed straight into the
+    final video, so there is no intermediate MP3 re-encode.
+    """
     inputs = processor(text=text, return_tensors="pt").to(DEVICE)
     with torch.no_grad():
         speech = model.generate_speech(inputs["input_ids"], speaker_embedding, vocoder=vocoder)
     
-    # Save as wav first (as that's the raw output)
-    import soundfile as sf
-    temp_wav = output_path.replace(".mp3", ".wav")
-    sf.write(temp_wav, speech.cpu().numpy(), samplerate=16000)
-    
-    # Convert wav to mp3 using moviepy (or ffmpeg)
-    AudioFileClip(temp_wav).write_audiofile(output_path, logger=None)
-    os.remove(temp_wav)
+    sf.write(output_path, speech.cpu().numpy(), samplerate=16000)
     return output_path
 
+def generate_speech_on_stream(stream, *args):
+    """Runs generate_speech on a separate CUDA stream (if given) and waits for it to finish."""
+    if stream is None:
+        return generate_speech(*args)
+    with torch.cuda.stream(stream):
+        output_path = generate_speech(*args)
+    stream.synchronize()
+    return output_path
+
+def get_image_batch_size():
+    """Returns how many prompts to send to the image pipeline per call."""
+    if DEVICE == "cuda" and torch.cuda.get_device_properties(0).total_memory < LOW_VRAM_BYTES:
+        return LOW_VRAM_IMAGE_BATCH_SIZE
+    return MAX_IMAGE_BATCH_SIZE
+
+def encode_prompts(generator, prompts):
+    """
+    Returns (prompt_embeds, pooled_prompt_embeds) for a list of prompts.
+    Both SDXL text encoders run once, batched, over the prompts not seen
+    recently; everything else comes from a small LRU cache.
+    """
+    missing = list(dict.fromkeys(p for p in prompts if p not in _prompt_embed_cache))
+    if missing:
+        with torch.no_grad():
+            embeds, _, pooled, _ = generator.encode_prompt(
+                prompt=missing,
+                device=generator._execution_device, # first text encoder's GPU when sharded
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False # guidance_scale=0.0 needs no negative embeddings
+            )
+        for i, prompt in enumerate(missing):
+            _prompt_embed_cache[prompt] = (embeds[i:i + 1], pooled[i:i + 1])
+
+    for prompt in prompts:
+        _prompt_embed_cache.move_to_end(prompt)
+    prompt_embeds = torch.cat([_prompt_embed_cache[p][0] for p in prompts])
+    pooled_prompt_embeds = torch.cat([_prompt_embed_cache[p][1] for p in prompts])
+
+    while len(_prompt_embed_cache) > PROMPT_EMBED_CACHE_SIZE:
+        _prompt_embed_cache.popitem(last=False)
+    return prompt_embeds, pooled_prompt_embeds
+
+def run_image_batch(generator, prompts):
+    """
+    Runs one pipeline call with static shapes: the batch is padded with empty
+    prompts to get_image_batch_size() and always rendered at IMAGE_WIDTH x
+    IMAGE_HEIGHT, so the compiled UNet replays a single CUDA graph. Only the
+    images for the real prompts are returned.
+    """
+    padded = prompts + [""] * (get_image_batch_size() - len(prompts))
+    prompt_embeds, pooled_prompt_embeds = encode_prompts(generator, padded)
+    images = generator(prompt_embeds=prompt_embeds,
+                       pooled_prompt_embeds=pooled_prompt_embeds,
+                       height=IMAGE_HEIGHT,
+                       width=IMAGE_WIDTH,
+                       num_inference_steps=IMAGE_INFERENCE_STEPS,
+                       guidance_scale=IMAGE_GUIDANCE_SCALE).images
+    return images[:len(prompts)]
+
 def generate_images(generator, sentences, style, video_key):
     """Generates 3-5 images based on key sentences."""
     image_paths = []
     num_images = min(max(3, len(sentences) // 2), 5) # Aim for 3-5 images
     
-    # 1. Generate Hook Image (from first sentence)
+    # 1. Hook Image (from first sentence) is always prompts[0]
     hook_prompt = f"{sentences[0]}, {style}, cinematic, high detail, trending on artstation"
-    print(f"[Creator] Generating hook image: {hook_prompt}")
-    image = generator(prompt=hook_prompt, num_inference_steps=25).images[0]
-    img_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_img_0.png")
-    image.save(img_path)
-    image_paths.append(img_path)
+    prompts = [hook_prompt]
 
-    # 2. Generate Subsequent Images
+    # 2. Subsequent Images
     sentence_indices = [i * (len(sentences) // (num_images - 1)) for i in range(1, num_images)]
-    
-    for i, sent_idx in enumerate(sentence_indices):
-        if sent_idx < len(sentences):
-            prompt = f"{sentences[sent_idx]}, {style}, cinematic, atmospheric"
-            print(f"[Creator] Generating image {i+1}: {prompt}")
-            image = generator(prompt=prompt, num_inference_steps=20).images[0]
-            img_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_img_{i+1}.png")
-            image.save(img_path)
-            image_paths.append(img_path)
+    prompts += [f"{sentences[i]}, {style}, cinematic, atmospheric" for i in sentence_indices if i < len(sentences)]
+
+    # 3. Generate all images in as few pipeline calls as VRAM allows
+    batch_size = get_image_batch_size()
+    images = []
+    for start in range(0, len(prompts), batch_size):
+        batch = prompts[start:start + batch_size]
+        print(f"[Creator] Generating images {start}-{start + len(batch) - 1}: {batch}")
+        images += run_image_batch(generator, batch)
+
+    for i, image in enumerate(images):
+        img_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_img_{i}.png")
+        image.save(img_path)
+        image_paths.append(img_path)
             
     return image_paths, hook_prompt
 
 # --- Video Assembly Functions ---
 
-def create_ken_burns_clip(image_path, duration, clip_size):
-    """Creates a single ImageClip with a Ken Burns (pan and zoom) effect."""
-    
-    # Define clip size
+def probe_duration(media_path):
+    """Returns the duration of an audio/video file in seconds, via ffprobe."""
+    output = subprocess.check_output([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        media_path
+    ])
+    return float(output)
+
+def escape_filter_path(path):
+    """Escapes a file path for use as a quoted option value inside an ffmpeg filtergraph."""
+    return path.replace('\\', '/').replace(':', '\\:')
+
+def ken_burns_filter(input_index, num_frames, clip_size):
+    """
+    Builds the filter chain for one still image: cover-crop to 9:16 and zoom
+    out from 1.5x to 1.1x over the clip (the Ken Burns effect), in one
+    libavfilter pass. The image is upscaled 2x first so zoompan's integer
+    crop offsets don't make the motion jitter.
+    """
     w, h = clip_size
-    
-    # Load image, crop to 9:16 aspect ratio
-    img_clip = (ImageClip(image_path)
-                .set_duration(duration)
-                .resize(height=h * 1.5)) # Start zoomed in (1.5x)
-    
-    # Crop to 9:16
-    img_clip = img_clip.crop(x_center=img_clip.w / 2, y_center=img_clip.h / 2, width=w, height=h)
-
-    # Animate zoom (from 1.5x to 1.1x)
-    zoomed_clip = img_clip.fx(vfx.resize, newsize=lambda t: 1.5 - 0.4 * (t / duration))
-    
-    # Animate pan (slight horizontal movement)
-    pan_x = random.choice([-10, 10]) * (duration) # pixels to move
-    final_clip = zoomed_clip.set_position(lambda t: ('center', 'center'))
-
-    return final_clip
+    return (f"[{input_index}:v]"
+            f"scale={w * 2}:{h * 2}:force_original_aspect_ratio=increase,crop={w * 2}:{h * 2},"
+            f"zoompan=z='1.5-0.4*on/{num_frames}':x='iw/2-iw/zoom/2':y='ih/2-ih/zoom/2'"
+            f":d={num_frames}:s={w}x{h}:fps={VIDEO_FPS},setsar=1"
+            f"[v{input_index}]")
+
+def format_ass_time(seconds):
+    """Formats seconds as an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = round(seconds * 100)
+    minutes, cs = divmod(centiseconds, 6000)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{cs / 100:05.2f}"
+
+def write_subtitles(path, sentences, duration_per_sentence, clip_size):
+    """
+    Writes the captions as an ASS script for ffmpeg's subtitles filter (libass).
+    PlayRes matches the output frame so sizes are in pixels: white 80px bold text
+    with a 2px black outline, wrapped to 80% of the width, top edge 80% down.
+    """
+    w, h = clip_size
+    margin_x = round(w * 0.1)
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {w}",
+        f"PlayResY: {h}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, Bold, "
+        "BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV",
+        f"Style: Default,{CAPTION_FONT},80,&H00FFFFFF,&H00000000,&H00000000,-1,"
+        f"1,2,0,8,{margin_x},{margin_x},{round(h * 0.8)}",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for i, sentence in enumerate(sentences):
+        # Braces and backslashes would be parsed as ASS override tags
+        text = sentence.replace('\\', '/').replace('{', '(').replace('}', ')')
+        start = format_ass_time(i * duration_per_sentence)
+        end = format_ass_time((i + 1) * duration_per_sentence)
+        lines.append(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}")
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+@functools.lru_cache(maxsize=None)
+def nvenc_available():
+    """Checks once whether this ffmpeg build ships the h264_nvenc encoder."""
+    try:
+        encoders = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                  capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return 'h264_nvenc' in encoders
+
+def video_encoder_args():
+    """Encoder flags: NVENC on the GPU when available, otherwise a fast libx264 preset on all cores."""
+    if DEVICE == "cuda" and nvenc_available():
+        return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-b:v', '6M']
+    return ['-c:v', 'libx264', '-preset', 'veryfast', '-threads', str(os.cpu_count() or 0)]
 
 def create_video_file(video_key, sentences, image_paths, audio_path):
-    """Assembles images, audio, and captions into the final MP4."""
+    """
+    Assembles images, audio, and captions into the final MP4 with a single
+    ffmpeg invocation: per-image zoompan, concat, burned-in subtitles, audio mux.
+    """
     
     print(f"[Creator] Assembling video for {video_key}...")
     
-    audio_clip = AudioFileClip(audio_path)
-    video_duration = audio_clip.duration
+    video_duration = probe_duration(audio_path)
     duration_per_image = video_duration / len(image_paths)
     
-    clip_size = (1080, 1920) # YouTube Short format (9:16)
-    
-    # Create Ken Burns clips
-    image_clips = []
-    for i, img_path in enumerate(image_paths):
-        clip = create_ken_burns_clip(img_path, duration_per_image, clip_size)
-        clip = clip.set_start(i * duration_per_image)
-        image_clips.append(clip)
-
-    # Create Captions (simple one-by-one)
-    # This is a simple implementation. A better one would time-base it.
-    caption_clips = []
-    duration_per_sentence = video_duration / len(sentences)
-    for i, sentence in enumerate(sentences):
-        caption = (TextClip(sentence,
-                             fontsize=80,
-                             color='white',
-                             font='Inter-Bold', # Assumes 'Inter-Bold' is available
-                             stroke_color='black',
-                             stroke_width=2,
-                             method='caption',
-                             size=(clip_size[0] * 0.8, None)) # 80% width
-                   .set_duration(duration_per_sentence)
-                   .set_start(i * duration_per_sentence)
-                   .set_position(('center', 0.8), relative=True)) # 80% down
-        caption_clips.append(caption)
-
-    # Combine all clips
-    final_video = CompositeVideoClip(image_clips + caption_clips, size=clip_size)
-    final_video = final_video.set_audio(audio_clip)
-    final_video = final_video.set_duration(video_duration)
+    clip_size = VIDEO_SIZE # YouTube Short format (9:16)
     
+    # Inputs: one still per image, then the narration
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error']
+    for img_path in image_paths:
+        cmd += ['-i', img_path]
+    cmd += ['-i', audio_path]
+
+    # Ken Burns segments, with frame counts rounded cumulatively so they add up to the audio
+    filters = []
+    for i in range(len(image_paths)):
+        start_frame = round(i * duration_per_image * VIDEO_FPS)
+        end_frame = round((i + 1) * duration_per_image * VIDEO_FPS)
+        filters.append(ken_burns_filter(i, max(end_frame - start_frame, 1), clip_size))
+    segments = ''.join(f"[v{i}]" for i in range(len(image_paths)))
+    filters.append(f"{segments}concat=n={len(image_paths)}:v=1:a=0[vcat]")
+
+    # Captions (simple one-by-one), rasterized in-process by libass
+    subtitles_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_captions.ass")
+    write_subtitles(subtitles_path, sentences, video_duration / len(sentences), clip_size)
+    filters.append(f"[vcat]subtitles=filename='{escape_filter_path(subtitles_path)}'[vout]")
+
     output_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_final.mp4")
-    final_video.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac', logger=None)
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[vout]', '-map', f"{len(image_paths)}:a",
+        *video_encoder_args(),
+        '-pix_fmt', 'yuv420p', '-r', str(VIDEO_FPS),
+        '-c:a', 'aac', '-shortest',
+        output_path
+    ]
+    try:
+        subprocess.run(cmd, check=True)
+    finally:
+        os.remove(subtitles_path)
     
     return output_path
 
@@ -242,55 +503,34 @@ What do you think of the ending? Let us know in the comments!
 
 # --- Main Logic ---
 
-def main():
-    conn = get_db_connection()
-    if not conn:
-        return
-        
-    job = get_pending_job(conn)
-    if not job:
-        print("[Creator] No pending jobs found.")
-        conn.close()
-        return
-
+def process_job(conn, models, job, story, sentences, tts_stream=None):
+    """Runs one claimed job with its generated story through speech -> images -> video."""
     video_key = job['video_key']
     genre = job['genre']
     style = job['image_style']
     voice = job['voice']
     
-    try:
-        # 1. Set status to CREATING
-        update_job_status(conn, video_key, 'CREATING')
+    text_model, text_tokenizer, speech_proc, speech_model, vocoder, speaker_map, img_gen = models
 
-        # 2. Load models
-        models = initialize_models()
-        if not models[0]: # Check if text_generator loaded
-            raise Exception("Failed to initialize models.")
-        
-        text_gen, speech_proc, speech_model, vocoder, speaker_map, img_gen = models
-        
-        # 3. Generate Text
-        print(f"[Creator] Generating text for {video_key}...")
-        story, sentences = generate_text_and_sentences(text_gen, genre)
-        
-        # 4. Generate Speech
-        print(f"[Creator] Generating speech for {video_key}...")
-        audio_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_narration.mp3")
+    try:
+        # 1 + 2. Generate Speech in the background while the images render
+        print(f"[Creator] Generating speech and images for {video_key}...")
+        audio_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_narration.wav")
         speaker_embedding = speaker_map.get(voice, speaker_map['en_US-ljspeech-medium']) # Default
-        generate_speech(speech_proc, speech_model, vocoder, speaker_embedding, story, audio_path)
-
-        # 5. Generate Images
-        print(f"[Creator] Generating images for {video_key}...")
-        image_paths, hook_prompt = generate_images(img_gen, sentences, style, video_key)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            speech_future = executor.submit(generate_speech_on_stream, tts_stream,
+                                            speech_proc, speech_model, vocoder, speaker_embedding, story, audio_path)
+            image_paths, hook_prompt = generate_images(img_gen, sentences, style, video_key)
+            speech_future.result()
         
-        # 6. Assemble Video
+        # 3. Assemble Video
         print(f"[Creator] Assembling video for {video_key}...")
         video_path = create_video_file(video_key, sentences, image_paths, audio_path)
 
-        # 7. Create Caption File
+        # 4. Create Caption File
         caption_path = create_caption_file(video_key, story, genre, hook_prompt)
 
-        # 8. Update Status to CREATED
+        # 5. Update Status to CREATED
         update_job_status(conn, video_key, 'CREATED', script=story, hook=hook_prompt)
         
         print(f"[Creator] Success: Job {video_key} complete!")
@@ -302,8 +542,104 @@ def main():
         import traceback
         traceback.print_exc()
         update_job_status(conn, video_key, 'FAILED')
+
+def process_jobs(conn, models, jobs, tts_stream=None):
+    """Generates the stories for a batch of claimed jobs together, then builds each video."""
+    text_model, text_tokenizer = models[:2]
+    try:
+        print(f"[Creator] Generating text for {', '.join(job['video_key'] for job in jobs)}...")
+        stories = generate_text_and_sentences(text_model, text_tokenizer, [job['genre'] for job in jobs])
+    except Exception as e:
+        print(f"Error generating stories: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        for job in jobs:
+            update_job_status(conn, job['video_key'], 'FAILED')
+        return
+
+    for job, (story, sentences) in zip(jobs, stories):
+        process_job(conn, models, job, story, sentences, tts_stream)
+
+def run_worker(once=False, shard=False, batch_size=STORY_BATCH_SIZE):
+    """
+    Long-lived worker loop: loads the models once, then drains PENDING jobs,
+    claiming up to `batch_size` per poll. When the queue is empty it sleeps
+    and only re-queries after another connection (e.g. brain.py) has
+    committed to the database.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        models = initialize_models(shard=shard)
+        if not models[0]: # Check if the text model loaded
+            print("[Creator] Failed to initialize models.", file=sys.stderr)
+            return
+        warmup_models(models)
+        # Side stream so SpeechT5 kernels can overlap with the SDXL ones
+        tts_stream = torch.cuda.Stream() if DEVICE == "cuda" else None
+
+        while True:
+            # Read before the query: a commit landing between the SELECT and the idle wait
+            # then still differs from this baseline and wakes the worker straight away
+            last_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            jobs = get_pending_jobs(conn, batch_size)
+            if jobs:
+                # Another worker may have grabbed some between SELECT and UPDATE
+                claimed = [job for job in jobs if claim_job(conn, job['video_key'])]
+                if claimed:
+                    process_jobs(conn, models, claimed, tts_stream)
+                continue
+
+            if once:
+                print("[Creator] No pending jobs found.")
+                return
+
+            # Idle: wait until someone else writes to the database
+            while conn.execute("PRAGMA data_version").fetchone()[0] == last_version:
+                time.sleep(WORKER_POLL_INTERVAL)
     finally:
-        conn.close()
+        close_db_connection(conn)
+
+def main():
+    args = sys.argv[1:]
+    if '--download' in args:
+        download_models()
+        return
+
+    once = '--once' in args
+    shard = '--shard' in args
+    num_gpus = torch.cuda.device_count()
+    if once or shard or num_gpus < 2:
+        # --shard: a single worker whose SDXL pipeline spans every GPU (for GPUs too small to hold it alone)
+        run_worker(once=once, shard=shard and num_gpus > 1)
+        return
+
+    # One worker process per GPU; each one only sees its own device as 'cuda'
+    print(f"[Creator] Starting {num_gpus} workers, one per GPU.")
+    ctx = mp.get_context('spawn')
+    visible_devices = os.environ.get('CUDA_VISIBLE_DEVICES')
+    # Respect an operator-supplied mask: child i gets the i-th entry (an index or GPU UUID), not physical GPU i
+    if visible_devices:
+        device_ids = [device.strip() for device in visible_devices.split(',')][:num_gpus]
+    else:
+        device_ids = [str(gpu) for gpu in range(num_gpus)]
+    workers = []
+    for device_id in device_ids:
+        os.environ['CUDA_VISIBLE_DEVICES'] = device_id
+        # One job per claim, so the first worker to poll can't take the whole backlog
+        worker = ctx.Process(target=run_worker, kwargs={'batch_size': 1}, name=f"creator-cuda{device_id}")
+        worker.start()
+        workers.append(worker)
+
+    if visible_devices is None:
+        del os.environ['CUDA_VISIBLE_DEVICES']
+    else:
+        os.environ['CUDA_VISIBLE_DEVICES'] = visible_devices
+
+    for worker in workers:
+        worker.join()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,52 @@
+import sqlite3
+import sys
+
+# --- Configuration ---
+DB_NAME = 'master_db.sqlite'
+
+# Applied to every connection. WAL lets the hourly collector write while the
+# brain and creator read; the rest trades a little durability/RAM for fewer fsyncs.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",    # ~64 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+)
+
+# --- Database Functions ---
+
+def get_db_connection():
+    """Establishes a tuned connection to the SQLite database shared by all scripts."""
+    try:
+        conn = sqlite3.connect(DB_NAME, timeout=30)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    except sqlite3.Error as e:
+        print(f"Error connecting to database: {e}", file=sys.stderr)
+        return None
+
+def close_db_connection(conn):
+    """Lets SQLite refresh planner statistics it considers stale, then closes the connection."""
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        print(f"Error optimizing database: {e}", file=sys.stderr)
+    finally:
+        conn.close()
+
+def require_tables(conn, tables):
+    """
+    Checks that every table in `tables` exists. On a database that predates
+    a schema change, prints a hint to run migrate.py and returns False, so
+    the caller can stop before it reads or writes anything.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    missing = [table for table in tables if table not in existing]
+    if missing:
+        print(f"Error: database is missing table(s) {', '.join(missing)}. Run python migrate.py first.",
+              file=sys.stderr)
+        return False
+    return True
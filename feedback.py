@@ -3,29 +3,21 @@ import time
 import os
 import sys
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from db import get_db_connection, close_db_connection, require_tables
 
 # --- Configuration ---
-DB_NAME = 'master_db.sqlite'
-
 # !! IMPORTANT !! Set this environment variable before running.
 # On Linux/macOS: export YOUTUBE_API_KEY="your_api_key_here"
 # On Windows: set YOUTUBE_API_KEY="your_api_key_here"
 API_KEY = os.environ.get('YOUTUBE_API_KEY')
 YOUTUBE_API_SERVICE_NAME = 'youtube'
 YOUTUBE_API_VERSION = 'v3'
+REQUIRED_TABLES = ('videos', 'performance_log', 'fame_velocity')
+YOUTUBE_MAX_IDS_PER_REQUEST = 50 # videos.list accepts at most 50 comma-separated IDs
 
 # --- Database Functions ---
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
-        print(f"Error connecting to database: {e}", file=sys.stderr)
-        return None
-
 def get_uploaded_videos(conn):
     """
     Fetches all videos marked as 'UPLOADED' or 'ANALYZED'
@@ -35,72 +27,155 @@ def get_uploaded_videos(conn):
     cursor = conn.cursor()
     cursor.execute(
         """
-        SELECT video_key, youtube_id FROM videos
+        SELECT video_key, youtube_id, status, upload_time FROM videos
         WHERE status IN ('UPLOADED', 'ANALYZED') AND upload_time > ?
         """,
         (seven_days_ago,)
     )
     return cursor.fetchall()
 
-def insert_performance_log(conn, video_key, views, likes, comments):
-    """Inserts a new row into the performance_log table."""
-    timestamp = int(time.time())
-    try:
-        conn.execute(
-            """
-            INSERT INTO performance_log (video_key, timestamp, views, likes, comments)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (video_key, timestamp, views, likes, comments)
+def insert_performance_logs(conn, rows):
+    """
+    Inserts (video_key, timestamp, views, likes, comments) rows into the
+    performance_log table. Does not commit; see save_collector_run.
+    """
+    conn.executemany(
+        """
+        INSERT INTO performance_log (video_key, timestamp, views, likes, comments)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        rows
+    )
+
+def record_fame_velocity(conn, video_key):
+    """
+    Folds a video's view gain between 2 and 10 hours post-upload into the
+    fame_velocity running totals for its (genre, image_style, voice).
+    Does not commit; the caller commits together with the status change.
+    """
+    row = conn.execute(
+        """
+        SELECT
+            v.genre,
+            v.image_style,
+            v.voice,
+            MAX(p.views) - MIN(p.views) AS view_gain,
+            COUNT(p.log_id) AS data_points
+        FROM
+            videos v
+        JOIN
+            performance_log p ON v.video_key = p.video_key
+        WHERE
+            v.video_key = ? AND
+            p.timestamp BETWEEN (v.upload_time + 7200) AND (v.upload_time + 36000)
+        GROUP BY
+            v.video_key
+        """,
+        (video_key,)
+    ).fetchone()
+
+    # Need at least two data points to measure a gain
+    if not row or row['data_points'] < 2:
+        return
+
+    conn.execute(
+        """
+        INSERT INTO fame_velocity (genre, image_style, voice, total_gain, n)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (genre, image_style, voice) DO UPDATE SET
+            total_gain = total_gain + excluded.total_gain,
+            n = n + 1
+        """,
+        (row['genre'], row['image_style'], row['voice'], row['view_gain'])
+    )
+
+def mark_videos_analyzed(conn, video_keys):
+    """
+    Moves UPLOADED videos to ANALYZED and folds each one into fame_velocity.
+    A video only counts on its own UPLOADED -> ANALYZED transition, so an
+    overlapping collector run that already moved it doesn't count it twice.
+    Does not commit; see save_collector_run.
+    """
+    for video_key in video_keys:
+        cursor = conn.execute(
+            "UPDATE videos SET status = 'ANALYZED' WHERE video_key = ? AND status = 'UPLOADED'",
+            (video_key,)
         )
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"Error inserting log for {video_key}: {e}", file=sys.stderr)
+        if cursor.rowcount == 1:
+            record_fame_velocity(conn, video_key)
 
-def update_video_status(conn, video_key, new_status):
-    """Updates a video's status, e.g., from UPLOADED to ANALYZED."""
+def save_collector_run(conn, log_rows, analyzed_keys):
+    """Writes one collector run's logs and status changes in a single transaction. Returns True on success."""
     try:
-        conn.execute("UPDATE videos SET status = ? WHERE video_key = ?", (new_status, video_key))
+        insert_performance_logs(conn, log_rows)
+        mark_videos_analyzed(conn, analyzed_keys)
         conn.commit()
+        return True
     except sqlite3.Error as e:
-        print(f"Error updating status for {video_key}: {e}", file=sys.stderr)
+        conn.rollback()
+        print(f"Error saving collector run: {e}", file=sys.stderr)
+        return False
 
 
 # --- YouTube API Functions ---
 
 def get_youtube_service():
-    """Initializes the YouTube Data API service."""
+    """
+    Initializes the YouTube Data API service.
+    Uses the discovery document bundled with google-api-python-client (no
+    discovery fetch) and one keep-alive HTTP connection for every request
+    of the run, so the TLS handshake is paid once.
+    """
     if not API_KEY:
         print("Error: YOUTUBE_API_KEY environment variable not set.", file=sys.stderr)
         return None
     try:
-        return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, developerKey=API_KEY)
+        return build(
+            YOUTUBE_API_SERVICE_NAME,
+            YOUTUBE_API_VERSION,
+            developerKey=API_KEY,
+            http=build_http(),
+            static_discovery=True,
+            cache_discovery=False
+        )
     except Exception as e:
         print(f"Error building YouTube service: {e}", file=sys.stderr)
         return None
 
-def get_video_stats(service, youtube_id):
-    """Fetches the latest view, like, and comment count for a video."""
+def get_video_stats_batch(service, youtube_ids):
+    """
+    Fetches the latest view, like, and comment counts for up to
+    YOUTUBE_MAX_IDS_PER_REQUEST videos in a single API call.
+    Returns a dict of youtube_id -> stats; missing videos are left out.
+    """
     try:
         request = service.videos().list(
             part="statistics",
-            id=youtube_id
+            id=",".join(youtube_ids)
         )
         response = request.execute()
-        
-        if not response.get('items'):
-            print(f"Warning: No video found with ID {youtube_id}", file=sys.stderr)
-            return None
+    except Exception as e:
+        print(f"Error fetching stats for {', '.join(youtube_ids)}: {e}", file=sys.stderr)
+        return {}
 
-        stats = response['items'][0]['statistics']
-        return {
+    stats_map = {}
+    for item in response.get('items', []):
+        stats = item['statistics']
+        stats_map[item['id']] = {
             'views': int(stats.get('viewCount', 0)),
             'likes': int(stats.get('likeCount', 0)),
             'comments': int(stats.get('commentCount', 0))
         }
-    except Exception as e:
-        print(f"Error fetching stats for {youtube_id}: {e}", file=sys.stderr)
-        return None
+
+    for youtube_id in youtube_ids:
+        if youtube_id not in stats_map:
+            print(f"Warning: No video found with ID {youtube_id}", file=sys.stderr)
+    return stats_map
+
+def chunks(items, size):
+    """Yields consecutive slices of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 # --- Main Logic ---
 
@@ -108,52 +183,61 @@ def main():
     """
     Main function for the 'Collector'.
     Runs hourly (via cron) to fetch new stats for active videos.
+    Returns the process exit status (0 on success), so cron can report failures.
     """
     print("[Collector] Starting run...")
     
     service = get_youtube_service()
     if not service:
-        return
+        return 1
 
     conn = get_db_connection()
     if not conn:
-        return
+        return 1
 
     try:
+        # Checked before any API call, so a stale schema can't discard a run's logs at commit time
+        if not require_tables(conn, REQUIRED_TABLES):
+            return 1
+
         videos_to_check = get_uploaded_videos(conn)
         if not videos_to_check:
             print("[Collector] No active videos to check.")
-            return
+            return 0
 
         print(f"[Collector] Checking stats for {len(videos_to_check)} videos...")
         
+        trackable = []
         for video in videos_to_check:
-            video_key = video['video_key']
-            youtube_id = video['youtube_id']
-            
-            if not youtube_id:
-                print(f"Warning: Skipping {video_key}, no youtube_id.", file=sys.stderr)
+            if not video['youtube_id']:
+                print(f"Warning: Skipping {video['video_key']}, no youtube_id.", file=sys.stderr)
                 continue
+            trackable.append(video)
+
+        timestamp = int(time.time())
+        log_rows = []
+        analyzed_keys = []
+        for chunk in chunks(trackable, YOUTUBE_MAX_IDS_PER_REQUEST):
+            stats_map = get_video_stats_batch(service, [video['youtube_id'] for video in chunk])
 
-            stats = get_video_stats(service, youtube_id)
-            if stats:
-                insert_performance_log(
-                    conn,
-                    video_key,
-                    stats['views'],
-                    stats['likes'],
-                    stats['comments']
-                )
+            for video in chunk:
+                video_key = video['video_key']
+                stats = stats_map.get(video['youtube_id'])
+                if not stats:
+                    continue
+
+                log_rows.append((video_key, timestamp, stats['views'], stats['likes'], stats['comments']))
                 print(f"  -> Logged {video_key}: {stats['views']} views")
 
                 # After 12 hours, mark as ANALYZED so the brain can use it
-                upload_time = conn.execute("SELECT upload_time FROM videos WHERE video_key = ?", (video_key,)).fetchone()[0]
-                if (time.time() - upload_time) > 43200: # 12 hours
-                    update_video_status(conn, video_key, 'ANALYZED')
+                if video['status'] == 'UPLOADED' and (timestamp - video['upload_time']) > 43200: # 12 hours
+                    analyzed_keys.append(video_key)
+
+        return 0 if save_collector_run(conn, log_rows, analyzed_keys) else 1
 
     finally:
-        conn.close()
+        close_db_connection(conn)
         print("[Collector] Run complete.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
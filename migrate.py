@@ -0,0 +1,68 @@
+import sqlite3
+import sys
+from db import get_db_connection, close_db_connection
+
+# --- Configuration ---
+SCHEMA_FILE = 'schema.sql'
+
+# Indexes superseded by a composite index in schema.sql
+OBSOLETE_INDEXES = ['ix_videos_status']
+
+# The per-video 'Fame Velocity' window scan (as used by feedback.py and the
+# schema.sql backfill); its plan should range-scan ix_perflog_key_ts.
+FAME_VELOCITY_QUERY = """
+SELECT v.genre, v.image_style, v.voice, MAX(p.views) - MIN(p.views) AS view_gain
+FROM videos v
+JOIN performance_log p ON v.video_key = p.video_key
+WHERE v.status = 'ANALYZED' AND
+      p.timestamp BETWEEN (v.upload_time + 7200) AND (v.upload_time + 36000)
+GROUP BY v.video_key
+HAVING COUNT(p.log_id) > 1
+"""
+
+# --- Migration Functions ---
+
+def apply_schema(conn):
+    """Creates any missing tables/indexes from schema.sql (every statement is idempotent)."""
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    for index_name in OBSOLETE_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+    conn.commit()
+
+def analyze(conn):
+    """Refreshes the planner statistics so the new indexes are actually chosen."""
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def print_query_plan(conn):
+    """Prints EXPLAIN QUERY PLAN for the Fame Velocity window scan."""
+    print("[Migrate] Query plan for the Fame Velocity window scan:")
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {FAME_VELOCITY_QUERY}"):
+        print(f"  {row['detail']}")
+
+# --- Main Logic ---
+
+def main():
+    """
+    Creates master_db.sqlite or brings an existing one up to the current schema.
+    Returns the process exit status (0 on success).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return 1
+
+    try:
+        apply_schema(conn)
+        analyze(conn)
+        print_query_plan(conn)
+        print("[Migrate] Database is up to date.")
+        return 0
+    except sqlite3.Error as e:
+        print(f"Error migrating database: {e}", file=sys.stderr)
+        return 1
+    finally:
+        close_db_connection(conn)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
--- This schema defines the two core tables for the Fame Flywheel system.
+-- This schema defines the core tables for the Fame Flywheel system.
 
 -- The 'videos' table is the central command and control table.
 -- It tracks a video's entire lifecycle, from PENDING to ANALYZED.
@@ -28,3 +28,35 @@ CREATE TABLE IF NOT EXISTS performance_log (
     
     FOREIGN KEY (video_key) REFERENCES videos (video_key)
 );
+
+-- The 'fame_velocity' table holds running 'Fame Velocity' totals per parameter combination.
+-- feedback.py adds each video's 2-10 hour view gain once, when it becomes ANALYZED,
+-- so the brain reads the best combination without re-scanning performance_log.
+CREATE TABLE IF NOT EXISTS fame_velocity (
+    genre TEXT NOT NULL,
+    image_style TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    total_gain REAL NOT NULL DEFAULT 0,  -- Sum of view gains across the combination's videos
+    n INTEGER NOT NULL DEFAULT 0,        -- Number of videos folded into total_gain
+
+    PRIMARY KEY (genre, image_style, voice)
+);
+
+-- Backfill from videos that were ANALYZED before this table existed.
+-- INSERT OR IGNORE leaves combinations that are already tracked untouched, so re-running is safe.
+INSERT OR IGNORE INTO fame_velocity (genre, image_style, voice, total_gain, n)
+SELECT genre, image_style, voice, SUM(view_gain), COUNT(*)
+FROM (
+    SELECT v.genre, v.image_style, v.voice, MAX(p.views) - MIN(p.views) AS view_gain
+    FROM videos v
+    JOIN performance_log p ON v.video_key = p.video_key
+    WHERE v.status = 'ANALYZED' AND
+          p.timestamp BETWEEN (v.upload_time + 7200) AND (v.upload_time + 36000)
+    GROUP BY v.video_key
+    HAVING COUNT(p.log_id) > 1
+)
+GROUP BY genre, image_style, voice;
+
+-- Indexes for the per-video window scan and the status filters.
+CREATE INDEX IF NOT EXISTS ix_perflog_key_ts ON performance_log (video_key, timestamp);
+CREATE INDEX IF NOT EXISTS ix_videos_status_key ON videos (status, video_key);
@@ -1,49 +1,50 @@
 import sqlite3
-import torch
-from moviepy.editor import *
 import os
 import sys
 import random
-import re
+import time
+import wave
+import subprocess
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from db import get_db_connection, close_db_connection
 
 # --- Configuration ---
-DB_NAME = 'master_db.sqlite'
 VIDEO_OUTPUT_DIR = 'created_videos'
+VIDEO_SIZE = (1080, 1920)
+VIDEO_FPS = 24
+CAPTION_FONT = 'Inter' # Assumes 'Inter' (Bold) is installed for fontconfig
+MOCK_SAMPLE_RATE = 44100
+MOCK_SEED = 1234 # placeholder colors are identical across runs, for profiling
+ENCODE_THREADS = 4 # per ffmpeg process; the background and caption renders run side by side
+USE_NVENC = os.environ.get('USE_NVENC') == '1' # opt-in: NVENC availability varies per host
 print(f"[Test Creator] Running in DRY-RUN mode.")
 
 # Ensure output directory exists
 os.makedirs(VIDEO_OUTPUT_DIR, exist_ok=True)
 
 # --- Database Functions ---
-# (Copied directly from creator.py)
-
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+# (Connection helpers come from db.py; the job queries write without committing)
 
 def update_job_status(conn, video_key, status, script=None, hook=None):
-    """Updates the status and (optionally) the generated script/hook of a job."""
-    sql = "UPDATE videos SET status = ?"
-    params = [status]
-    
-    if script:
-        sql += ", generated_script = ?"
-        params.append(script)
-    if hook:
-        sql += ", hook_prompt = ?"
-        params.append(hook)
-        
-    sql += " WHERE video_key = ?"
-    params.append(video_key)
-    
-    conn.execute(sql, tuple(params))
-    conn.commit()
+    """
+    Updates the status and (optionally) the generated script/hook of a job.
+    Does not commit; main() commits once per phase of the job.
+    """
+    conn.execute(
+        """
+        UPDATE videos SET
+            status = ?,
+            generated_script = COALESCE(?, generated_script),
+            hook_prompt = COALESCE(?, hook_prompt)
+        WHERE video_key = ?
+        """,
+        (status, script, hook, video_key)
+    )
 
 def create_test_job(conn):
-    """Inserts a new PENDING job specifically for this test."""
-    video_key = f"v_test_{int(random.time())}"
+    """Inserts a new PENDING job specifically for this test. Does not commit."""
+    video_key = f"v_test_{time.time_ns()}"
     genre = "test_genre"
     style = "test_style"
     voice = "test_voice"
@@ -55,7 +56,6 @@ def create_test_job(conn):
             """,
             (video_key, 'PENDING', genre, style, voice)
         )
-        conn.commit()
         print(f"[Test Creator] Created test job: {video_key}")
         return video_key
     except sqlite3.Error as e:
@@ -72,102 +72,236 @@ def mock_generate_text_and_sentences():
     return story, sentences
 
 def mock_generate_speech(video_key, duration_seconds):
-    """Mocks the speech generation, creating a silent MP3."""
+    """Mocks the speech generation, writing a silent 16-bit mono PCM WAV."""
     print("[Test Creator] MOCK: Generating silent audio.")
-    audio_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_narration.mp3")
+    audio_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_narration.wav")
     
-    # Create a silent audio clip of the specified duration
-    silent_clip = AudioClip(lambda t: 0, duration=duration_seconds, fps=44100)
-    silent_clip.write_audiofile(audio_path, logger=None)
+    with wave.open(audio_path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(MOCK_SAMPLE_RATE)
+        wav.writeframes(b'\x00' * (round(duration_seconds * MOCK_SAMPLE_RATE) * 2))
     
     return audio_path
 
-def mock_generate_images(video_key, num_images):
-    """Mocks the image generation, creating solid color placeholder images."""
+def mock_generate_images(video_key, num_images, rng):
+    """
+    Mocks the image generation with solid color placeholders. Nothing is
+    written to disk: each "image" is an ffmpeg lavfi color source (a single
+    frame) that create_video_file() feeds straight into zoompan.
+    Colors are drawn from `rng` so a seeded run is reproducible.
+    """
     print(f"[Test Creator] MOCK: Generating {num_images} placeholder images.")
-    image_paths = []
     hook_prompt = "mocked hook prompt (first sentence)"
+    w, h = VIDEO_SIZE
     
-    for i in range(num_images):
-        img_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_img_{i}.png")
-        # Create a random solid color image
-        color = (random.randint(50, 200), random.randint(50, 200), random.randint(50, 200))
-        clip = ColorClip(size=(1080, 1920), color=color, duration=0.1)
-        clip.save_frame(img_path)
-        image_paths.append(img_path)
+    image_sources = []
+    for _ in range(num_images):
+        r, g, b = rng.randint(50, 200), rng.randint(50, 200), rng.randint(50, 200)
+        image_sources.append(f"color=c=0x{r:02x}{g:02x}{b:02x}:s={w}x{h}:r=1:d=1")
         
-    return image_paths, hook_prompt
+    return image_sources, hook_prompt
 
 # --- Video Assembly Functions ---
-# (Copied directly from creator.py)
+# (Filtergraph helpers copied from creator.py)
+
+def probe_duration(media_path):
+    """Returns the duration of an audio/video file in seconds, via ffprobe."""
+    output = subprocess.check_output([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        media_path
+    ])
+    return float(output)
 
-def create_ken_burns_clip(image_path, duration, clip_size):
-    """Creates a single ImageClip with a Ken Burns (pan and zoom) effect."""
+def escape_filter_path(path):
+    """Escapes a file path for use as a quoted option value inside an ffmpeg filtergraph."""
+    return path.replace('\\', '/').replace(':', '\\:')
+
+def ken_burns_filter(input_index, num_frames, clip_size):
+    """
+    Builds the filter chain for one still image: cover-crop to 9:16 and zoom
+    out from 1.5x to 1.1x over the clip (the Ken Burns effect).
+    """
     w, h = clip_size
-    img_clip = (ImageClip(image_path)
-                .set_duration(duration)
-                .resize(height=h * 1.5))
-    img_clip = img_clip.crop(x_center=img_clip.w / 2, y_center=img_clip.h / 2, width=w, height=h)
-    zoomed_clip = img_clip.fx(vfx.resize, newsize=lambda t: 1.5 - 0.4 * (t / duration))
-    pan_x = random.choice([-10, 10]) * (duration)
-    final_clip = zoomed_clip.set_position(lambda t: ('center', 'center'))
-    return final_clip
-
-def create_video_file(video_key, sentences, image_paths, audio_path):
-    """Assembles images, audio, and captions into the final MP4."""
-    print(f"[Test Creator] Assembling video for {video_key}...")
-    audio_clip = AudioFileClip(audio_path)
-    video_duration = audio_clip.duration
-    duration_per_image = video_duration / len(image_paths)
-    clip_size = (1080, 1920)
-
-    image_clips = []
-    for i, img_path in enumerate(image_paths):
-        clip = create_ken_burns_clip(img_path, duration_per_image, clip_size)
-        clip = clip.set_start(i * duration_per_image)
-        image_clips.append(clip)
-
-    caption_clips = []
-    duration_per_sentence = video_duration / len(sentences)
+    return (f"[{input_index}:v]"
+            f"scale={w * 2}:{h * 2}:force_original_aspect_ratio=increase,crop={w * 2}:{h * 2},"
+            f"zoompan=z='1.5-0.4*on/{num_frames}':x='iw/2-iw/zoom/2':y='ih/2-ih/zoom/2'"
+            f":d={num_frames}:s={w}x{h}:fps={VIDEO_FPS},setsar=1"
+            f"[v{input_index}]")
+
+def format_ass_time(seconds):
+    """Formats seconds as an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = round(seconds * 100)
+    minutes, cs = divmod(centiseconds, 6000)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{cs / 100:05.2f}"
+
+def write_subtitles(path, sentences, duration_per_sentence, clip_size):
+    """Writes the captions as an ASS script for ffmpeg's subtitles filter (libass)."""
+    w, h = clip_size
+    margin_x = round(w * 0.1)
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {w}",
+        f"PlayResY: {h}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, Bold, "
+        "BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV",
+        f"Style: Default,{CAPTION_FONT},80,&H00FFFFFF,&H00000000,&H00000000,-1,"
+        f"1,2,0,8,{margin_x},{margin_x},{round(h * 0.8)}",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
     for i, sentence in enumerate(sentences):
-        caption = (TextClip(sentence,
-                             fontsize=80,
-                             color='white',
-                             font='Inter-Bold',
-                             stroke_color='black',
-                             stroke_width=2,
-                             method='caption',
-                             size=(clip_size[0] * 0.8, None))
-                   .set_duration(duration_per_sentence)
-                   .set_start(i * duration_per_sentence)
-                   .set_position(('center', 0.8), relative=True))
-        caption_clips.append(caption)
-
-    final_video = CompositeVideoClip(image_clips + caption_clips, size=clip_size)
-    final_video = final_video.set_audio(audio_clip)
-    final_video = final_video.set_duration(video_duration)
-    
+        # Braces and backslashes would be parsed as ASS override tags
+        text = sentence.replace('\\', '/').replace('{', '(').replace('}', ')')
+        start = format_ass_time(i * duration_per_sentence)
+        end = format_ass_time((i + 1) * duration_per_sentence)
+        lines.append(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}")
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+def image_input_args(image_source):
+    """ffmpeg input flags for an image file, or for a lavfi source spec such as the mock 'color=...'."""
+    if image_source.startswith('color='):
+        return ['-f', 'lavfi', '-i', image_source]
+    return ['-i', image_source]
+
+def render_background(image_sources, video_duration, out_path):
+    """Renders the Ken Burns image track (per-image zoompan + concat) as a lossless intermediate."""
+    duration_per_image = video_duration / len(image_sources)
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error']
+    for image_source in image_sources:
+        cmd += image_input_args(image_source)
+
+    # Frame counts rounded cumulatively so the segments add up to the audio
+    filters = []
+    for i in range(len(image_sources)):
+        start_frame = round(i * duration_per_image * VIDEO_FPS)
+        end_frame = round((i + 1) * duration_per_image * VIDEO_FPS)
+        filters.append(ken_burns_filter(i, max(end_frame - start_frame, 1), VIDEO_SIZE))
+    segments = ''.join(f"[v{i}]" for i in range(len(image_sources)))
+    filters.append(f"{segments}concat=n={len(image_sources)}:v=1:a=0[vout]")
+
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[vout]',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-qp', '0', '-threads', str(ENCODE_THREADS),
+        out_path
+    ]
+    subprocess.run(cmd, check=True)
+    return out_path
+
+def render_captions(video_key, sentences, video_duration, out_path):
+    """Renders the captions onto a transparent canvas as a QuickTime RLE (alpha) track."""
+    w, h = VIDEO_SIZE
+    subtitles_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_captions.ass")
+    write_subtitles(subtitles_path, sentences, video_duration / len(sentences), VIDEO_SIZE)
+    try:
+        subprocess.run([
+            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+            # The canvas must be argb inside the lavfi graph itself, or the color source
+            # negotiates an opaque format; alpha=1 makes libass write coverage into the alpha plane
+            '-f', 'lavfi', '-i', f"color=c=black@0.0:s={w}x{h}:r={VIDEO_FPS}:d={video_duration},format=argb",
+            '-vf', f"subtitles=filename='{escape_filter_path(subtitles_path)}':alpha=1",
+            '-c:v', 'qtrle', '-threads', str(ENCODE_THREADS),
+            out_path
+        ], check=True)
+    finally:
+        os.remove(subtitles_path)
+    return out_path
+
+@functools.lru_cache(maxsize=None)
+def nvenc_available():
+    """Checks once whether this ffmpeg build ships the h264_nvenc encoder."""
+    try:
+        encoders = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                  capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return 'h264_nvenc' in encoders
+
+def video_encoder_args():
+    """Final encode flags: opt-in low-latency NVENC (USE_NVENC=1) when available, otherwise libx264 ultrafast."""
+    if USE_NVENC and nvenc_available():
+        return ['-c:v', 'h264_nvenc', '-preset', 'p1', '-tune', 'll', '-rc', 'cbr', '-b:v', '4M']
+    return ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'stillimage', '-threads', str(ENCODE_THREADS)]
+
+def create_video_file(video_key, sentences, image_sources, audio_path, video_duration=None):
+    """
+    Assembles images, audio, and captions into the final MP4. The image track
+    and the caption track render concurrently in two ffmpeg processes; a
+    final pass overlays them and muxes the narration.
+    Pass `video_duration` when the audio length is already known to skip the ffprobe call.
+    """
+    print(f"[Test Creator] Assembling video for {video_key}...")
+    if video_duration is None:
+        video_duration = probe_duration(audio_path)
+
+    background_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_background.mkv")
+    captions_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_captions.mov")
     output_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_final.mp4")
-    final_video.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac', logger=None)
-    
+    try:
+        # Each render is its own ffmpeg process, so threads are enough to run them side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            background = executor.submit(render_background, image_sources, video_duration, background_path)
+            captions = executor.submit(render_captions, video_key, sentences, video_duration, captions_path)
+            background.result()
+            captions.result()
+
+        subprocess.run([
+            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+            '-i', background_path, '-i', captions_path, '-i', audio_path,
+            '-filter_complex', "[0:v][1:v]overlay=format=auto[vout]",
+            '-map', '[vout]', '-map', '2:a',
+            *video_encoder_args(),
+            '-pix_fmt', 'yuv420p', '-r', str(VIDEO_FPS),
+            '-c:a', 'aac', '-shortest',
+            '-movflags', '+faststart', # moov atom up front so the file can be streamed
+            output_path
+        ], check=True)
+    finally:
+        for path in (background_path, captions_path):
+            if os.path.exists(path):
+                os.remove(path)
+
     return output_path
 
-def create_caption_file(video_key, story, genre, hook):
-    """Creates the text file with YouTube Title, Description, and data-tag."""
-    # (Copied directly from creator.py)
-    title = f"Shocking {genre.title()} Story! 😱 #shorts #{genre.replace(' ', '')}"
-    description = f"""
+_CAPTION_TMPL = """TITLE:
+Shocking {title_genre} Story! 😱 #shorts #{tag}
+
+DESCRIPTION:
+
 A {genre} story generated by the Fame Flywheel.
 What do you think of the ending? Let us know in the comments!
-#shorts #ai #storytelling #{genre.replace(' ', '')}
+#shorts #ai #storytelling #{tag}
 ---
-[data-tag: {video_key}]
+[data-tag: {key}]
 [hook-prompt: {hook}]
+
 """
+
+def create_caption_file(video_key, story, genre, hook):
+    """Creates the text file with YouTube Title, Description, and data-tag."""
+    # (Same text as creator.py, rendered from one module-level template)
+    caption = _CAPTION_TMPL.format(
+        title_genre=genre.title(),
+        genre=genre,
+        tag=genre.replace(' ', ''),
+        key=video_key,
+        hook=hook
+    )
     output_path = os.path.join(VIDEO_OUTPUT_DIR, f"{video_key}_caption.txt")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(f"TITLE:\n{title}\n\n")
-        f.write(f"DESCRIPTION:\n{description}\n")
+    with open(output_path, 'w', encoding='utf-8', buffering=-1) as f:
+        f.write(caption)
     return output_path
 
 # --- Main Logic ---
@@ -177,18 +311,18 @@ def main():
     if not conn:
         return
         
-    video_key = create_test_job(conn)
+    # 1. Create the job and set status to CREATING (one commit)
+    with conn:
+        video_key = create_test_job(conn)
+        if video_key:
+            # Get the genre of the job we just created
+            genre = conn.execute("SELECT genre FROM videos WHERE video_key = ?", (video_key,)).fetchone()[0]
+            update_job_status(conn, video_key, 'CREATING')
     if not video_key:
-        conn.close()
+        close_db_connection(conn)
         return
-
-    # Get the job details we just created
-    job = conn.execute("SELECT * FROM videos WHERE video_key = ?", (video_key,)).fetchone()
     
     try:
-        # 1. Set status to CREATING
-        update_job_status(conn, video_key, 'CREATING')
-
         # 2. Mock Generate Text
         story, sentences = mock_generate_text_and_sentences()
         
@@ -198,16 +332,17 @@ def main():
         audio_path = mock_generate_speech(video_key, video_duration)
 
         # 4. Mock Generate Images (one per sentence)
-        image_paths, hook_prompt = mock_generate_images(video_key, len(sentences))
+        image_sources, hook_prompt = mock_generate_images(video_key, len(sentences), random.Random(MOCK_SEED))
         
         # 5. Assemble Video (REAL)
-        video_path = create_video_file(video_key, sentences, image_paths, audio_path)
+        video_path = create_video_file(video_key, sentences, image_sources, audio_path, video_duration)
 
         # 6. Create Caption File (REAL)
-        caption_path = create_caption_file(video_key, story, job['genre'], hook_prompt)
+        caption_path = create_caption_file(video_key, story, genre, hook_prompt)
 
         # 7. Update Status to CREATED (REAL)
-        update_job_status(conn, video_key, 'CREATED', script=story, hook=hook_prompt)
+        with conn:
+            update_job_status(conn, video_key, 'CREATED', script=story, hook=hook_prompt)
         
         print(f"[Test Creator] Success: Job {video_key} complete!")
         print(f"  -> Video: {video_path}")
@@ -217,9 +352,10 @@ def main():
         print(f"Error processing test job {video_key}: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc()
-        update_job_status(conn, video_key, 'FAILED')
+        with conn:
+            update_job_status(conn, video_key, 'FAILED')
     finally:
-        conn.close()
+        close_db_connection(conn)
 
 if __name__ == "__main__":
     main()